@@ -0,0 +1,50 @@
+import asyncio
+from datetime import timedelta
+from typing import Optional
+
+class AddressPool:
+    def __init__(self, db, payment, logger, low_water: int = 20, batch_size: int = 50,
+                 recycle_after: timedelta = timedelta(hours=8), refill_interval: float = 30.0):
+        self.db = db
+        self.payment = payment
+        self.logger = logger
+        self.low_water = low_water
+        self.batch_size = batch_size
+        # Order lifetime (30 min) + late-payment window (6 h) + safety margin
+        self.recycle_after = recycle_after
+        self.refill_interval = refill_interval
+        self.refill_needed = asyncio.Event()
+
+    async def claim(self) -> Optional[str]:
+        # Never derives inline: an empty pool wakes the refill task and the caller retries later
+        address = await self.db.claim_deposit_address()
+        if not address:
+            self.refill_needed.set()
+            await self.logger.log("AddressPoolEmpty", details="No free deposit addresses")
+        return address
+
+    async def refill(self) -> int:
+        await self.db.recycle_deposit_addresses(self.recycle_after)
+        stats = await self.db.get_deposit_address_stats()
+        if stats["free"] >= self.low_water:
+            return 0
+        start = stats["last_index"] + 1
+        count = self.low_water - stats["free"] + self.batch_size
+        loop = asyncio.get_running_loop()
+        addresses = await loop.run_in_executor(None, self.payment.derive_tron_addresses, start, count)
+        await self.db.add_deposit_addresses(addresses)
+        return count
+
+    async def run(self):
+        while True:
+            try:
+                added = await self.refill()
+                if added:
+                    await self.logger.log("AddressPoolRefilled", details=f"Derived {added} deposit addresses")
+            except Exception as e:
+                await self.logger.log("system", details=f"Address pool refill failed: {e}")
+            try:
+                await asyncio.wait_for(self.refill_needed.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.refill_needed.clear()
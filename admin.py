@@ -1,17 +1,16 @@
 from typing import Dict
+import keyboards
 
 class Admin:
-    def __init__(self, telegram, db, key_manager, logger):
+    def __init__(self, telegram, db, key_manager, logger, renderer):
         self.telegram = telegram
         self.db = db
         self.key_manager = key_manager
         self.logger = logger
+        self.renderer = renderer
         self.admin_states = {}  # {user_id: {"step": str, "data": dict}}
 
     async def handle(self, chat_id: int, user_id: int, message: Dict, callback: Dict):
-        branding = await self.db.get_branding()
-        bot_name = branding["bot_name"]
-
         # Handle callback
         if callback:
             data = callback.get("data", "")
@@ -65,7 +64,15 @@ class Admin:
                 await self.telegram.send_message(
                     chat_id,
                     f"Recent logs:\n{log_text or 'No logs.'}",
-                    {"inline_keyboard": [[{"text": "Back", "callback_data": "admin_menu"}]]}
+                    keyboards.BACK_TO_ADMIN
+                )
+            elif data == "bot_stats":
+                counters = self.telegram.admission.counters
+                stats_text = "\n".join(f"{name}: {count}" for name, count in counters.items())
+                await self.telegram.send_message(
+                    chat_id,
+                    f"Update admission:\n{stats_text}\nOutbound queue: {self.telegram.queue.qsize()}",
+                    keyboards.BACK_TO_ADMIN
                 )
             elif data == "test_order":
                 variant = "Pro"
@@ -73,7 +80,7 @@ class Admin:
                     user_id, variant, 99.0, 99.0, "Test", crypto_address="TEST"
                 )
                 key = await self.key_manager.allocate_key(variant, order_id)
-                await self.db.update_order_status(order_id, "Confirmed", "NOW()")
+                await self.db.update_order_status(order_id, "Confirmed", paid=True)
                 await self.logger.log("TestOrder", user_id, order_id, f"Test order #{order_id}")
                 await self.telegram.send_message(
                     chat_id,
@@ -85,15 +92,26 @@ class Admin:
                 if not order:
                     return
                 variant = order["variant"]
-                key = await self.key_manager.allocate_key(variant, order_id)
+                key = None
+                # Status (live or archived row) and key allocation commit together
+                async with self.db.transaction():
+                    updated = await self.db.update_order_status(order_id, "Confirmed", paid=True)
+                    if updated:
+                        key = await self.key_manager.allocate_key(variant, order_id)
+                    if key:
+                        await self.logger.log("LatePaymentApproved", order["user_id"], order_id, f"Key delivered")
+                if not updated:
+                    await self.telegram.send_message(
+                        chat_id,
+                        f"Order #{order_id} could not be updated."
+                    )
+                    return
                 if not key:
                     await self.telegram.send_message(
                         chat_id,
                         f"No keys left for {variant}!"
                     )
                     return
-                await self.db.update_order_status(order_id, "Confirmed", "NOW()")
-                await self.logger.log("LatePaymentApproved", order["user_id"], order_id, f"Key delivered")
                 await self.telegram.send_message(
                     order["user_id"],
                     f"Order #{order_id} approved! Your {variant} key: `{key}`"
@@ -117,7 +135,7 @@ class Admin:
             await self.telegram.send_message(
                 chat_id,
                 f"Added {len(keys)} keys for {variant}.",
-                {"inline_keyboard": [[{"text": "Back", "callback_data": "admin_menu"}]]}
+                keyboards.BACK_TO_ADMIN
             )
             self.admin_states.pop(user_id, None)
             return
@@ -131,10 +149,7 @@ class Admin:
                 await self.telegram.send_message(
                     chat_id,
                     f"Select role for user #{user_id_to_assign}:",
-                    {"inline_keyboard": [[
-                        {"text": "Normal", "callback_data": "role_Normal"},
-                        {"text": "Reseller", "callback_data": "role_Reseller"}
-                    ]]}
+                    keyboards.ROLE_CHOICE
                 )
             except ValueError:
                 await self.telegram.send_message(chat_id, "Invalid user ID!")
@@ -162,7 +177,7 @@ class Admin:
                 await self.telegram.send_message(
                     chat_id,
                     f"Balance for user #{user_id_to_adjust} adjusted by ${amount:.2f}.",
-                    {"inline_keyboard": [[{"text": "Back", "callback_data": "admin_menu"}]]}
+                    keyboards.BACK_TO_ADMIN
                 )
                 self.admin_states.pop(user_id, None)
             except ValueError:
@@ -181,11 +196,12 @@ class Admin:
         elif state["step"] == "enter_welcome_message" and text:
             bot_name = state["data"]["bot_name"]
             await self.db.update_branding(bot_name, text)
+            self.renderer.invalidate_branding()
             await self.logger.log("BrandingUpdated", details=f"Set bot_name={bot_name}")
             await self.telegram.send_message(
                 chat_id,
                 f"Branding updated: {bot_name}, '{text}'.",
-                {"inline_keyboard": [[{"text": "Back", "callback_data": "admin_menu"}]]}
+                keyboards.BACK_TO_ADMIN
             )
             self.admin_states.pop(user_id, None)
             return
@@ -197,22 +213,12 @@ class Admin:
         await self.telegram.send_message(
             chat_id,
             "Admin Menu:",
-            {"inline_keyboard": [
-                [{"text": "Add Keys", "callback_data": "add_keys"}],
-                [{"text": "Assign Role", "callback_data": "assign_role"}],
-                [{"text": "Adjust Balance", "callback_data": "adjust_balance"}],
-                [{"text": "Set Branding", "callback_data": "set_branding"}],
-                [{"text": "View Logs", "callback_data": "view_logs"}],
-                [{"text": "Test Order", "callback_data": "test_order"}]
-            ]}
+            keyboards.ADMIN_MENU
         )
 
     async def show_variants(self, chat_id: int, text: str):
-        products = await self.db.get_products()
-        buttons = [[{"text": p["variant"], "callback_data": f"variant_keys_{p['variant']}"}]
-                   for p in products]
         await self.telegram.send_message(
             chat_id,
             text,
-            {"inline_keyboard": buttons}
+            await self.renderer.admin_variants_markup()
         )
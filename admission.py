@@ -0,0 +1,83 @@
+import time
+from typing import Dict, Tuple
+
+# Callbacks that create orders; these survive overload shedding. The owner (who approves keys)
+# bypasses admission entirely.
+TRANSACTIONAL_CALLBACKS = ("pay_",)
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class AdmissionController:
+    def __init__(self, rate: float = 1.0, burst: int = 5, duplicate_window: float = 5.0,
+                 overload_queue_depth: int = 200, sweep_interval: float = 60.0):
+        self.rate = rate  # sustained updates/second per user
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.overload_queue_depth = overload_queue_depth  # outbound backlog that triggers shedding
+        self.sweep_interval = sweep_interval
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.recent_callbacks: Dict[Tuple[int, str], float] = {}
+        self.last_sweep = time.monotonic()
+        self.counters = {"admitted": 0, "duplicate": 0, "rate_limited": 0, "shed": 0}
+
+    def is_transactional(self, callback: Dict, checkout_reply: bool = False) -> bool:
+        # Text messages count when they answer a checkout prompt (e.g. the top-up amount)
+        if not callback:
+            return checkout_reply
+        return callback.get("data", "").startswith(TRANSACTIONAL_CALLBACKS)
+
+    def admit(self, user_id: int, callback: Dict, queue_depth: int, checkout_reply: bool = False) -> bool:
+        now = time.monotonic()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        # Repeated taps on an admitted button inside the window are dropped outright
+        key = (user_id, callback.get("data", "")) if callback else None
+        if key is not None:
+            seen_at = self.recent_callbacks.get(key)
+            if seen_at is not None and now - seen_at < self.duplicate_window:
+                self.counters["duplicate"] += 1
+                return False
+
+        if queue_depth >= self.overload_queue_depth and not self.is_transactional(callback, checkout_reply):
+            self.counters["shed"] += 1
+            return False
+
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(self.rate, self.burst, now)
+        if not bucket.take(now):
+            self.counters["rate_limited"] += 1
+            return False
+
+        # Only admitted taps open the duplicate window, so a rejected tap can be retried
+        if key is not None:
+            self.recent_callbacks[key] = now
+        self.counters["admitted"] += 1
+        return True
+
+    def sweep(self, now: float):
+        # Forget idle users so the tables stay bounded by recent activity
+        self.recent_callbacks = {
+            key: seen_at for key, seen_at in self.recent_callbacks.items()
+            if now - seen_at < self.duplicate_window
+        }
+        idle_after = self.burst / self.rate
+        self.buckets = {
+            user_id: bucket for user_id, bucket in self.buckets.items()
+            if now - bucket.updated < idle_after
+        }
+        self.last_sweep = now
@@ -0,0 +1,32 @@
+import asyncio
+from datetime import timedelta
+
+class OrderArchiver:
+    def __init__(self, db, logger, retention: timedelta = timedelta(hours=7), batch_size: int = 500,
+                 interval: float = 600.0, batch_pause: float = 0.5):
+        self.db = db
+        self.logger = logger
+        # Late-payment window (6 h) + margin, counted from expires_at
+        self.retention = retention
+        self.batch_size = batch_size
+        self.interval = interval
+        self.batch_pause = batch_pause
+
+    async def archive(self) -> int:
+        archived = 0
+        while True:
+            moved = await self.db.archive_orders(self.retention, self.batch_size)
+            archived += moved
+            if moved < self.batch_size:
+                return archived
+            await asyncio.sleep(self.batch_pause)  # Let live traffic in between batches
+
+    async def run(self):
+        while True:
+            try:
+                archived = await self.archive()
+                if archived:
+                    await self.logger.log("OrdersArchived", details=f"Archived {archived} orders")
+            except Exception as e:
+                await self.logger.log("system", details=f"Order archival failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,67 @@
+import json
+import time
+import orjson
+import keyboards
+
+# Micro-benchmark: outbound sendMessage bodies and getUpdates parsing, before vs after
+# keyboards pre-encoding + orjson. Run with `python bench_encoding.py`.
+
+PRODUCTS = [
+    {"variant": "Basic", "price_usd": 50.0},
+    {"variant": "Pro", "price_usd": 99.0},
+    {"variant": "Premium", "price_usd": 150.0},
+]
+N = 100_000
+
+def catalog_dict() -> dict:
+    return {"inline_keyboard": [
+        [{"text": f"{p['variant']} ${p['price_usd']:.2f}", "callback_data": f"variant_{p['variant']}"}]
+        for p in PRODUCTS
+    ]}
+
+def admin_menu_dict() -> dict:
+    return {"inline_keyboard": [
+        [{"text": "Add Keys", "callback_data": "add_keys"}],
+        [{"text": "Assign Role", "callback_data": "assign_role"}],
+        [{"text": "Adjust Balance", "callback_data": "adjust_balance"}],
+        [{"text": "Set Branding", "callback_data": "set_branding"}],
+        [{"text": "View Logs", "callback_data": "view_logs"}],
+        [{"text": "Test Order", "callback_data": "test_order"}],
+        [{"text": "Bot Stats", "callback_data": "bot_stats"}]
+    ]}
+
+def before(build_markup) -> float:
+    # Old path: rebuild the keyboard dict for every message, stdlib json (what aiohttp's json= uses)
+    start = time.perf_counter()
+    for chat_id in range(N):
+        payload = {"chat_id": chat_id, "text": "Choose your license, gamer!", "parse_mode": "Markdown",
+                   "reply_markup": build_markup()}
+        json.dumps(payload).encode()
+    return N / (time.perf_counter() - start)
+
+def after(markup: bytes) -> float:
+    start = time.perf_counter()
+    for chat_id in range(N):
+        payload = {"chat_id": chat_id, "text": "Choose your license, gamer!", "parse_mode": "Markdown",
+                   "reply_markup": markup}
+        keyboards.encode_request(payload)
+    return N / (time.perf_counter() - start)
+
+def parse_updates(loads) -> float:
+    body = json.dumps({"ok": True, "result": [
+        {"update_id": i, "callback_query": {"id": str(i), "from": {"id": 1000 + i, "is_bot": False},
+                                            "message": {"chat": {"id": 1000 + i}}, "data": "browse"}}
+        for i in range(100)
+    ]}).encode()
+    start = time.perf_counter()
+    for _ in range(N // 100):
+        loads(body)
+    return N / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    catalog = keyboards.encode_markup(catalog_dict())
+    for name, build, markup in [("catalog", catalog_dict, catalog), ("admin menu", admin_menu_dict, keyboards.ADMIN_MENU)]:
+        old, new = before(build), after(markup)
+        print(f"{name:<11} encode: {old:>10,.0f} msg/s before  {new:>10,.0f} msg/s after  ({new / old:.1f}x)")
+    old, new = parse_updates(json.loads), parse_updates(orjson.loads)
+    print(f"getUpdates  parse:  {old:>10,.0f} upd/s before  {new:>10,.0f} upd/s after  ({new / old:.1f}x)")
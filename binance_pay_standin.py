@@ -0,0 +1,90 @@
+import aiohttp
+import argparse
+import asyncio
+import base64
+import json
+import os
+import secrets
+import time
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+# Local stand-in for Binance Pay: sends notifications signed the same way the real service does,
+# so the webhook can be exercised without a merchant account.
+
+class BinancePayStandIn:
+    def __init__(self, webhook_url: str, private_key_pem: bytes = None):
+        self.webhook_url = webhook_url
+        if private_key_pem:
+            self.private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+        else:
+            self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    @property
+    def private_key_pem(self) -> bytes:
+        return self.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        )
+
+    @property
+    def public_key_pem(self) -> bytes:
+        return self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def sign(self, timestamp: str, nonce: str, body: bytes) -> str:
+        payload = timestamp.encode() + b"\n" + nonce.encode() + b"\n" + body + b"\n"
+        return base64.b64encode(self.private_key.sign(payload, padding.PKCS1v15(), hashes.SHA256())).decode()
+
+    async def send_notification(self, merchant_trade_no: str, total_fee: float,
+                                status: str = "PAY_SUCCESS", currency: str = "USDT") -> int:
+        body = json.dumps({
+            "bizType": "PAY",
+            "bizId": secrets.randbelow(10 ** 18),
+            "bizStatus": status,
+            "data": json.dumps({
+                "merchantTradeNo": merchant_trade_no,
+                "totalFee": total_fee,
+                "currency": currency,
+                "transactTime": int(time.time() * 1000)
+            })
+        }).encode()
+        timestamp = str(int(time.time() * 1000))
+        nonce = secrets.token_hex(16)
+        headers = {
+            "Content-Type": "application/json",
+            "BinancePay-Timestamp": timestamp,
+            "BinancePay-Nonce": nonce,
+            "BinancePay-Signature": self.sign(timestamp, nonce, body)
+        }
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.webhook_url, data=body, headers=headers) as resp:
+                return resp.status
+
+async def main():
+    parser = argparse.ArgumentParser(description="Send a signed Binance Pay notification to the bot")
+    parser.add_argument("merchant_trade_no")
+    parser.add_argument("total_fee", type=float)
+    parser.add_argument("--status", default="PAY_SUCCESS")
+    parser.add_argument("--url", default="http://localhost:8080/binancepay/webhook")
+    parser.add_argument("--key", default="binance_standin.pem",
+                        help="private key; created on first run, point BINANCE_PAY_CERT at <key>.pub")
+    args = parser.parse_args()
+
+    if os.path.exists(args.key):
+        with open(args.key, "rb") as f:
+            standin = BinancePayStandIn(args.url, f.read())
+    else:
+        standin = BinancePayStandIn(args.url)
+        with open(args.key, "wb") as f:
+            f.write(standin.private_key_pem)
+        with open(f"{args.key}.pub", "wb") as f:
+            f.write(standin.public_key_pem)
+        print(f"Created {args.key}; start the bot with BINANCE_PAY_CERT={args.key}.pub")
+    print(await standin.send_notification(args.merchant_trade_no, args.total_fee, args.status))
+
+if __name__ == "__main__":
+    asyncio.run(main())
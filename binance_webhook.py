@@ -0,0 +1,94 @@
+import asyncio
+import base64
+import json
+import time
+from aiohttp import web
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+class BinancePayWebhook:
+    def __init__(self, public_key_pem: bytes, db, payment, key_manager, logger, telegram,
+                 host: str = "0.0.0.0", port: int = 8080, path: str = "/binancepay/webhook",
+                 max_clock_skew: int = 300):
+        self.public_key = serialization.load_pem_public_key(public_key_pem)
+        self.db = db
+        self.payment = payment
+        self.key_manager = key_manager
+        self.logger = logger
+        self.telegram = telegram
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_clock_skew = max_clock_skew  # seconds; rejects replayed notifications
+
+    def verify(self, timestamp: str, nonce: str, body: bytes, signature: str) -> bool:
+        # Binance Pay signs "timestamp\nnonce\nbody\n" with RSA-SHA256
+        try:
+            if abs(time.time() - int(timestamp) / 1000) > self.max_clock_skew:
+                return False
+            self.public_key.verify(
+                base64.b64decode(signature),
+                timestamp.encode() + b"\n" + nonce.encode() + b"\n" + body + b"\n",
+                padding.PKCS1v15(),
+                hashes.SHA256()
+            )
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verify(
+            request.headers.get("BinancePay-Timestamp", ""),
+            request.headers.get("BinancePay-Nonce", ""),
+            body,
+            request.headers.get("BinancePay-Signature", "")
+        ):
+            await self.logger.log("system", details="Rejected Binance Pay webhook: bad signature")
+            return web.json_response({"returnCode": "FAIL", "returnMessage": "invalid signature"}, status=401)
+
+        try:
+            notification = json.loads(body)
+            if notification["bizType"] != "PAY":
+                return web.json_response({"returnCode": "SUCCESS", "returnMessage": None})
+            status = notification["bizStatus"]
+            data = json.loads(notification["data"])
+            if not isinstance(data, dict):
+                raise ValueError("data is not an object")
+        except (ValueError, KeyError, TypeError) as e:
+            await self.logger.log("system", details=f"Malformed Binance Pay webhook: {e!r}")
+            return web.json_response({"returnCode": "FAIL", "returnMessage": "malformed notification"}, status=400)
+
+        async with self.db.unit_of_work():
+            await self.process_payment(status, data)
+        return web.json_response({"returnCode": "SUCCESS", "returnMessage": None})
+
+    async def process_payment(self, status: str, data: dict):
+        order_id = self.payment.order_id_from_trade_no(data.get("merchantTradeNo", ""))
+        order = await self.db.get_order(order_id) if order_id else None
+        if not order or order["payment_method"] != "BinancePay":
+            await self.logger.log("system", details=f"Binance Pay webhook for unknown order {data.get('merchantTradeNo')}")
+            return
+        if status != "PAY_SUCCESS":
+            await self.logger.log("BinancePayStatus", order["user_id"], order_id, f"Order #{order_id}: {status}")
+            return
+        if float(data.get("totalFee", 0)) < float(order["price_usd"]):
+            await self.logger.log("Underpaid", order["user_id"], order_id, f"Order #{order_id} paid {data.get('totalFee')}")
+            return
+
+        if order["status"] == "Pending":
+            if await self.payment.deliver_order(order, self.db, self.key_manager, self.logger, self.telegram):
+                return
+            # Lost the race with the poller (expired) or another confirmation; re-read to tell which
+            order = await self.db.get_order(order_id)
+        if order["status"] == "Expired":
+            await self.payment.notify_late_payment(order, self.logger, self.telegram)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        await asyncio.Event().wait()  # Serve until cancelled
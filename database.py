@@ -1,189 +1,310 @@
 import asyncpg
 import asyncio
-from typing import List, Dict, Optional
+import contextvars
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Tuple
+from datetime import timedelta
+from migrator import Migrator
+from tracing import span, traced
+
+# Queries on the update/payment hot path, prepared once per pooled connection
+HOT_QUERIES = {
+    "get_user": "SELECT * FROM users WHERE user_id = $1",
+    "create_user": "INSERT INTO users (user_id, role, balance) VALUES ($1, 'Normal', 0.0) ON CONFLICT DO NOTHING",
+    "get_products": "SELECT * FROM products",
+    "create_order": """
+        INSERT INTO orders (user_id, variant, price_usd, price_usdt, payment_method, crypto_address,
+                           binance_pay_link, status, created_at, expires_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, 'Pending', NOW(), NOW() + INTERVAL '30 minutes')
+        RETURNING order_id
+    """,
+    "get_order": "SELECT * FROM orders WHERE order_id = $1",
+    "get_archived_order": "SELECT * FROM orders_archive WHERE order_id = $1",
+    "update_order_status": "UPDATE orders SET status = $1 WHERE order_id = $2 RETURNING order_id",
+    "update_order_status_paid": """
+        UPDATE orders SET status = $1, paid_at = NOW() WHERE order_id = $2 RETURNING order_id
+    """,
+    "update_archived_order_status": "UPDATE orders_archive SET status = $1 WHERE order_id = $2 RETURNING order_id",
+    "update_archived_order_status_paid": """
+        UPDATE orders_archive SET status = $1, paid_at = NOW() WHERE order_id = $2 RETURNING order_id
+    """,
+    "confirm_order": """
+        UPDATE orders SET status = 'Confirmed', paid_at = NOW()
+        WHERE order_id = $1 AND status = 'Pending'
+        RETURNING order_id
+    """,
+    "expire_order": """
+        UPDATE orders SET status = 'Expired'
+        WHERE order_id = $1 AND status = 'Pending'
+        RETURNING order_id
+    """,
+    "set_binance_pay_link": "UPDATE orders SET binance_pay_link = $1 WHERE order_id = $2",
+    "get_pending_orders": """
+        SELECT * FROM orders
+        WHERE status = 'Pending' OR (status = 'Expired' AND expires_at > NOW() - INTERVAL '6 hours')
+    """,
+    "select_available_key": """
+        SELECT key_id, key_value FROM keys
+        WHERE variant = $1 AND status = 'Available'
+        LIMIT 1 FOR UPDATE SKIP LOCKED
+    """,
+    "mark_key_used": """
+        UPDATE keys SET status = 'Used', order_id = $1, allocated_at = NOW()
+        WHERE key_id = $2
+    """,
+    "get_key_count": "SELECT COUNT(*) FROM keys WHERE variant = $1 AND status = 'Available'",
+    "log_event": "INSERT INTO logs (event_type, user_id, order_id, details) VALUES ($1, $2, $3, $4)",
+    "get_branding": "SELECT * FROM branding LIMIT 1",
+    "update_balance": "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
+    "lock_user_balance": "SELECT balance FROM users WHERE user_id = $1 FOR UPDATE",
+    "create_paid_order": """
+        INSERT INTO orders (user_id, variant, price_usd, price_usdt, payment_method,
+                           status, created_at, expires_at, paid_at)
+        VALUES ($1, $2, $3, $3, 'Balance', 'Confirmed', NOW(), NOW(), NOW())
+        RETURNING order_id
+    """,
+    "claim_deposit_address": """
+        UPDATE deposit_addresses SET status = 'Assigned', claimed_at = NOW()
+        WHERE address_id = (
+            SELECT address_id FROM deposit_addresses
+            WHERE status = 'Free'
+            ORDER BY address_id
+            LIMIT 1 FOR UPDATE SKIP LOCKED
+        )
+        RETURNING address
+    """,
+}
+
+class PreparedConnection(asyncpg.Connection):
+    async def prepare_hot_queries(self):
+        self.statements = {name: await self.prepare(sql) for name, sql in HOT_QUERIES.items()}
+
+class UnitOfWork:
+    # One lazily acquired pool connection shared by every Database call in the owning task
+    def __init__(self, pool, acquire_timeout: float):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.task = asyncio.current_task()
+        self.conn = None
+
+    async def acquire(self):
+        if self.conn is None:
+            with span("Database.acquire"):
+                self.conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        return self.conn
+
+    async def release(self):
+        if self.conn is not None:
+            await self.pool.release(self.conn)
+            self.conn = None
 
 class Database:
-    def __init__(self, url: str):
+    def __init__(self, url: str, min_size: int = 2, max_size: int = 10,
+                 statement_cache_size: int = 100, acquire_timeout: float = 10.0):
         self.url = url
         self.pool = None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.acquire_timeout = acquire_timeout
+        self.current_uow = contextvars.ContextVar("current_uow", default=None)
 
     async def init(self):
-        self.pool = await asyncpg.create_pool(self.url)
-        await self.create_tables()
-
-    async def create_tables(self):
-        async with self.pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    role TEXT DEFAULT 'Normal',
-                    balance DECIMAL DEFAULT 0.0,
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-                CREATE TABLE IF NOT EXISTS products (
-                    product_id SERIAL PRIMARY KEY,
-                    name TEXT,
-                    variant TEXT,
-                    price_usd DECIMAL
-                );
-                CREATE TABLE IF NOT EXISTS orders (
-                    order_id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    variant TEXT,
-                    price_usd DECIMAL,
-                    price_usdt DECIMAL,
-                    payment_method TEXT,
-                    crypto_address TEXT,
-                    binance_pay_link TEXT,
-                    status TEXT DEFAULT 'Pending',
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    expires_at TIMESTAMP,
-                    paid_at TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS keys (
-                    key_id SERIAL PRIMARY KEY,
-                    variant TEXT,
-                    key_value TEXT,
-                    status TEXT DEFAULT 'Available',
-                    order_id BIGINT,
-                    allocated_at TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS logs (
-                    log_id SERIAL PRIMARY KEY,
-                    order_id BIGINT,
-                    user_id BIGINT,
-                    event_type TEXT,
-                    details TEXT,
-                    timestamp TIMESTAMP DEFAULT NOW()
-                );
-                CREATE TABLE IF NOT EXISTS branding (
-                    id SERIAL PRIMARY KEY,
-                    bot_name TEXT DEFAULT 'GameKeyBot',
-                    welcome_message TEXT DEFAULT 'Welcome, gamer! Ready to unlock your license?',
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-            """)
-            # Seed products if empty
-            count = await conn.fetchval("SELECT COUNT(*) FROM products")
-            if count == 0:
-                await conn.execute("""
-                    INSERT INTO products (name, variant, price_usd) VALUES
-                    ('License', 'Basic', 50.0),
-                    ('License', 'Pro', 99.0),
-                    ('License', 'Premium', 150.0);
-                """)
-            # Seed branding if empty
-            count = await conn.fetchval("SELECT COUNT(*) FROM branding")
-            if count == 0:
-                await conn.execute("""
-                    INSERT INTO branding (bot_name, welcome_message) VALUES
-                    ('GameKeyBot', 'Welcome, gamer! Ready to unlock your license?');
-                """)
+        # Migrate first so hot statements are prepared against the current schema
+        conn = await asyncpg.connect(self.url)
+        try:
+            await Migrator().migrate(conn)
+        finally:
+            await conn.close()
+        self.pool = await asyncpg.create_pool(
+            self.url,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            connection_class=PreparedConnection,
+            init=PreparedConnection.prepare_hot_queries
+        )
+
+    @asynccontextmanager
+    async def connection(self):
+        uow = self.current_uow.get()
+        # Tasks spawned inside a unit of work inherit the context but must not share its connection
+        if uow is not None and uow.task is asyncio.current_task():
+            yield await uow.acquire()
+        else:
+            with span("Database.acquire"):
+                conn = await self.pool.acquire(timeout=self.acquire_timeout)
+            try:
+                yield conn
+            finally:
+                await self.pool.release(conn)
 
+    @asynccontextmanager
+    async def unit_of_work(self):
+        uow = self.current_uow.get()
+        if uow is not None and uow.task is asyncio.current_task():
+            yield uow
+            return
+        uow = UnitOfWork(self.pool, self.acquire_timeout)
+        token = self.current_uow.set(uow)
+        try:
+            yield uow
+        finally:
+            self.current_uow.reset(token)
+            await uow.release()
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.unit_of_work():
+            async with self.connection() as conn:
+                async with conn.transaction():
+                    yield conn
+
+    @traced
     async def get_user(self, user_id: int) -> Optional[Dict]:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
+        async with self.connection() as conn:
+            return await conn.statements["get_user"].fetchrow(user_id)
 
+    @traced
     async def create_user(self, user_id: int):
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO users (user_id, role, balance) VALUES ($1, 'Normal', 0.0) ON CONFLICT DO NOTHING",
-                user_id
-            )
+        async with self.connection() as conn:
+            await conn.statements["create_user"].fetchval(user_id)
 
+    @traced
     async def get_products(self) -> List[Dict]:
-        async with self.pool.acquire() as conn:
-            return await conn.fetch("SELECT * FROM products")
+        async with self.connection() as conn:
+            return await conn.statements["get_products"].fetch()
 
+    @traced
     async def create_order(self, user_id: int, variant: str, price_usd: float, price_usdt: float,
                           payment_method: str, crypto_address: str = None, binance_pay_link: str = None) -> int:
-        async with self.pool.acquire() as conn:
-            expires_at = "NOW() + INTERVAL '30 minutes'"
-            order_id = await conn.fetchval(
-                """
-                INSERT INTO orders (user_id, variant, price_usd, price_usdt, payment_method, crypto_address,
-                                   binance_pay_link, status, created_at, expires_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, 'Pending', NOW(), %s)
-                RETURNING order_id
-                """ % expires_at,
+        async with self.connection() as conn:
+            return await conn.statements["create_order"].fetchval(
                 user_id, variant, price_usd, price_usdt, payment_method, crypto_address, binance_pay_link
             )
-            return order_id
 
+    @traced
     async def get_order(self, order_id: int) -> Optional[Dict]:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT * FROM orders WHERE order_id = $1", order_id)
-
-    async def update_order_status(self, order_id: int, status: str, paid_at: str = None):
-        async with self.pool.acquire() as conn:
-            if paid_at:
-                await conn.execute(
-                    "UPDATE orders SET status = $1, paid_at = $2 WHERE order_id = $3",
-                    status, paid_at, order_id
-                )
-            else:
-                await conn.execute(
-                    "UPDATE orders SET status = $1 WHERE order_id = $2",
-                    status, order_id
-                )
+        async with self.connection() as conn:
+            order = await conn.statements["get_order"].fetchrow(order_id)
+            if order is None:
+                order = await conn.statements["get_archived_order"].fetchrow(order_id)
+            return order
+
+    @traced
+    async def update_order_status(self, order_id: int, status: str, paid: bool = False) -> bool:
+        # Mirrors get_order: orders moved to the archive are updated in place there
+        suffix = "_paid" if paid else ""
+        async with self.connection() as conn:
+            updated = await conn.statements["update_order_status" + suffix].fetchval(status, order_id)
+            if updated is None:
+                updated = await conn.statements["update_archived_order_status" + suffix].fetchval(status, order_id)
+            return updated is not None
+
+    @traced
+    async def confirm_order(self, order_id: int) -> bool:
+        async with self.connection() as conn:
+            confirmed = await conn.statements["confirm_order"].fetchval(order_id)
+            return confirmed is not None
+
+    @traced
+    async def expire_order(self, order_id: int) -> bool:
+        async with self.connection() as conn:
+            expired = await conn.statements["expire_order"].fetchval(order_id)
+            return expired is not None
 
+    @traced
+    async def set_binance_pay_link(self, order_id: int, link: str):
+        async with self.connection() as conn:
+            await conn.statements["set_binance_pay_link"].fetchval(link, order_id)
+
+    @traced
     async def get_pending_orders(self) -> List[Dict]:
-        async with self.pool.acquire() as conn:
-            return await conn.fetch("SELECT * FROM orders WHERE status = 'Pending' OR status = 'Expired'")
+        async with self.connection() as conn:
+            return await conn.statements["get_pending_orders"].fetch()
 
+    @traced
+    async def archive_orders(self, older_than: timedelta, batch_size: int) -> int:
+        # One short statement per batch; SKIP LOCKED leaves rows in use by payment handling alone
+        async with self.connection() as conn:
+            result = await conn.execute(
+                """
+                WITH moved AS (
+                    DELETE FROM orders WHERE order_id IN (
+                        SELECT order_id FROM orders
+                        WHERE status IN ('Confirmed', 'Expired') AND expires_at < NOW() - $1::interval
+                        ORDER BY order_id
+                        LIMIT $2 FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING order_id, user_id, variant, price_usd, price_usdt, payment_method,
+                              crypto_address, binance_pay_link, status, created_at, expires_at, paid_at
+                )
+                INSERT INTO orders_archive (order_id, user_id, variant, price_usd, price_usdt, payment_method,
+                                            crypto_address, binance_pay_link, status, created_at, expires_at, paid_at)
+                SELECT order_id, user_id, variant, price_usd, price_usdt, payment_method,
+                       crypto_address, binance_pay_link, status, created_at, expires_at, paid_at
+                FROM moved
+                """,
+                older_than, batch_size
+            )
+            return int(result.split()[-1])
+
+    @traced
     async def add_key(self, variant: str, key_value: str):
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             await conn.execute(
                 "INSERT INTO keys (variant, key_value, status) VALUES ($1, $2, 'Available')",
                 variant, key_value
             )
 
+    @traced
     async def allocate_key(self, variant: str, order_id: int) -> Optional[str]:
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             async with conn.transaction():
-                key = await conn.fetchrow(
-                    """
-                    SELECT key_id, key_value FROM keys
-                    WHERE variant = $1 AND status = 'Available'
-                    LIMIT 1 FOR UPDATE
-                    """,
-                    variant
-                )
+                key = await conn.statements["select_available_key"].fetchrow(variant)
                 if not key:
                     return None
-                await conn.execute(
-                    """
-                    UPDATE keys SET status = 'Used', order_id = $1, allocated_at = NOW()
-                    WHERE key_id = $2
-                    """,
-                    order_id, key["key_id"]
-                )
+                await conn.statements["mark_key_used"].fetchval(order_id, key["key_id"])
                 return key["key_value"]
 
+    @traced
+    async def purchase_with_balance(self, user_id: int, variant: str, price_usd: float) -> Dict:
+        # The user row lock serializes concurrent purchases by the same user
+        async with self.transaction() as conn:
+            balance = await conn.statements["lock_user_balance"].fetchval(user_id)
+            if balance is None or balance < price_usd:
+                return {"result": "insufficient", "balance": balance or 0}
+            key = await conn.statements["select_available_key"].fetchrow(variant)
+            if not key:
+                return {"result": "no_key", "balance": balance}
+            await conn.statements["update_balance"].fetchval(-price_usd, user_id)
+            order_id = await conn.statements["create_paid_order"].fetchval(user_id, variant, price_usd)
+            await conn.statements["mark_key_used"].fetchval(order_id, key["key_id"])
+            return {"result": "ok", "order_id": order_id, "key_value": key["key_value"]}
+
+    @traced
     async def get_key_count(self, variant: str) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(
-                "SELECT COUNT(*) FROM keys WHERE variant = $1 AND status = 'Available'",
-                variant
-            )
+        async with self.connection() as conn:
+            return await conn.statements["get_key_count"].fetchval(variant)
 
+    @traced
     async def log_event(self, event_type: str, user_id: int = None, order_id: int = None, details: str = None):
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO logs (event_type, user_id, order_id, details) VALUES ($1, $2, $3, $4)",
-                event_type, user_id, order_id, details
-            )
+        async with self.connection() as conn:
+            await conn.statements["log_event"].fetchval(event_type, user_id, order_id, details)
 
+    @traced
     async def get_logs(self, limit: int = 50) -> List[Dict]:
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             return await conn.fetch("SELECT * FROM logs ORDER BY timestamp DESC LIMIT $1", limit)
 
+    @traced
     async def get_branding(self) -> Dict:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT * FROM branding LIMIT 1")
+        async with self.connection() as conn:
+            return await conn.statements["get_branding"].fetchrow()
 
+    @traced
     async def update_branding(self, bot_name: str, welcome_message: str):
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             await conn.execute(
                 """
                 UPDATE branding SET bot_name = $1, welcome_message = $2, updated_at = NOW()
@@ -192,13 +313,55 @@ class Database:
                 bot_name, welcome_message
             )
 
+    @traced
     async def update_balance(self, user_id: int, amount: float):
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
-                amount, user_id
+        async with self.connection() as conn:
+            await conn.statements["update_balance"].fetchval(amount, user_id)
+
+    @traced
+    async def claim_deposit_address(self) -> Optional[str]:
+        async with self.connection() as conn:
+            return await conn.statements["claim_deposit_address"].fetchval()
+
+    @traced
+    async def add_deposit_addresses(self, addresses: List[Tuple[int, str]]):
+        async with self.connection() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO deposit_addresses (derivation_index, address, status)
+                VALUES ($1, $2, 'Free') ON CONFLICT DO NOTHING
+                """,
+                addresses
+            )
+
+    @traced
+    async def recycle_deposit_addresses(self, hold: timedelta) -> int:
+        async with self.connection() as conn:
+            result = await conn.execute(
+                """
+                UPDATE deposit_addresses d SET status = 'Free', claimed_at = NULL
+                WHERE d.status = 'Assigned' AND d.claimed_at < NOW() - $1::interval
+                  AND NOT EXISTS (
+                      SELECT 1 FROM orders o
+                      WHERE o.crypto_address = d.address AND o.status = 'Pending'
+                  )
+                """,
+                hold
+            )
+            return int(result.split()[-1])
+
+    @traced
+    async def get_deposit_address_stats(self) -> Dict:
+        async with self.connection() as conn:
+            return await conn.fetchrow(
+                """
+                SELECT COUNT(*) FILTER (WHERE status = 'Free') AS free,
+                       COALESCE(MAX(derivation_index), -1) AS last_index
+                FROM deposit_addresses
+                """
             )
 
+    @traced
     async def get_users(self) -> List[Dict]:
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             return await conn.fetch("SELECT * FROM users")
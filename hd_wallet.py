@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+from typing import Tuple
+
+# Public-only BIP32 derivation for TRON deposit addresses. Only the account xpub
+# (m/44'/195'/0') lives on the server; the matching xprv stays in the owner's wallet,
+# which is what can spend from every address derived here.
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+XPUB_VERSION = bytes.fromhex("0488b21e")
+ACCOUNT_DEPTH = 3  # m/44'/195'/0'
+
+# secp256k1
+P = 2 ** 256 - 2 ** 32 - 977
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+def base58check_encode(raw: bytes) -> str:
+    payload = raw + hashlib.sha256(hashlib.sha256(raw).digest()).digest()[:4]
+    number = int.from_bytes(payload, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    padding = len(payload) - len(payload.lstrip(b"\x00"))
+    return BASE58_ALPHABET[0] * padding + encoded
+
+def base58check_decode(encoded: str) -> bytes:
+    number = 0
+    for char in encoded:
+        number = number * 58 + BASE58_ALPHABET.index(char)
+    padding = len(encoded) - len(encoded.lstrip(BASE58_ALPHABET[0]))
+    payload = b"\x00" * padding + number.to_bytes((number.bit_length() + 7) // 8, "big")
+    raw, checksum = payload[:-4], payload[-4:]
+    if hashlib.sha256(hashlib.sha256(raw).digest()).digest()[:4] != checksum:
+        raise ValueError("bad base58check checksum")
+    return raw
+
+def point_add(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a[0] == b[0] and (a[1] + b[1]) % P == 0:
+        return None
+    if a == b:
+        slope = 3 * a[0] * a[0] * pow(2 * a[1], -1, P) % P
+    else:
+        slope = (b[1] - a[1]) * pow(b[0] - a[0], -1, P) % P
+    x = (slope * slope - a[0] - b[0]) % P
+    return x, (slope * (a[0] - x) - a[1]) % P
+
+def point_mul(k: int, point=G):
+    result = None
+    while k:
+        if k & 1:
+            result = point_add(result, point)
+        point = point_add(point, point)
+        k >>= 1
+    return result
+
+def compress(point) -> bytes:
+    return bytes([2 + (point[1] & 1)]) + point[0].to_bytes(32, "big")
+
+def decompress(key: bytes):
+    if len(key) != 33 or key[0] not in (2, 3):
+        raise ValueError("expected a compressed public key")
+    x = int.from_bytes(key[1:], "big")
+    y = pow((x * x * x + 7) % P, (P + 1) // 4, P)
+    if (y * y - x * x * x - 7) % P:
+        raise ValueError("public key is not on secp256k1")
+    if (y & 1) != (key[0] & 1):
+        y = P - y
+    return x, y
+
+def derive_child(point, chain_code: bytes, index: int) -> Tuple[tuple, bytes]:
+    # CKDpub: non-hardened children only
+    digest = hmac.new(chain_code, compress(point) + index.to_bytes(4, "big"), hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], "big")
+    child = point_add(point_mul(tweak), point)
+    if tweak >= N or child is None:
+        raise ValueError(f"invalid child index {index}")
+    return child, digest[32:]
+
+KECCAK_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+KECCAK_ROTATIONS = [
+    [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61],
+    [28, 55, 25, 21, 56], [27, 20, 39, 8, 14],
+]
+MASK64 = 2 ** 64 - 1
+
+def keccak_f(lanes):
+    for constant in KECCAK_ROUND_CONSTANTS:
+        c = [lanes[x][0] ^ lanes[x][1] ^ lanes[x][2] ^ lanes[x][3] ^ lanes[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ (((c[(x + 1) % 5] << 1) | (c[(x + 1) % 5] >> 63)) & MASK64) for x in range(5)]
+        lanes = [[lanes[x][y] ^ d[x] for y in range(5)] for x in range(5)]
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                r = KECCAK_ROTATIONS[x][y]
+                b[y][(2 * x + 3 * y) % 5] = ((lanes[x][y] << r) | (lanes[x][y] >> (64 - r))) & MASK64 if r else lanes[x][y]
+        lanes = [[b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y]) for y in range(5)] for x in range(5)]
+        lanes[0][0] ^= constant
+    return lanes
+
+def keccak256(data: bytes) -> bytes:
+    # Original Keccak padding (0x01), as used by TRON/Ethereum; hashlib.sha3_256 pads with 0x06
+    rate = 136
+    padded = bytearray(data) + b"\x01" + b"\x00" * ((-len(data) - 1) % rate)
+    padded[-1] |= 0x80
+    lanes = [[0] * 5 for _ in range(5)]
+    for offset in range(0, len(padded), rate):
+        block = padded[offset:offset + rate]
+        for i in range(rate // 8):
+            lanes[i % 5][i // 5] ^= int.from_bytes(block[8 * i:8 * i + 8], "little")
+        lanes = keccak_f(lanes)
+    return b"".join(lanes[i % 5][i // 5].to_bytes(8, "little") for i in range(4))
+
+def tron_address(point) -> str:
+    public_key = point[0].to_bytes(32, "big") + point[1].to_bytes(32, "big")
+    return base58check_encode(b"\x41" + keccak256(public_key)[-20:])
+
+class TronAddressDeriver:
+    # Addresses are m/44'/195'/0'/0/{index} derived from the account xpub
+    def __init__(self, xpub: str):
+        if not xpub:
+            raise ValueError("TRON_XPUB is not set")
+        raw = base58check_decode(xpub)
+        if len(raw) != 78 or raw[:4] != XPUB_VERSION:
+            raise ValueError("TRON_XPUB must be a BIP32 extended public key (xpub...)")
+        if raw[4] != ACCOUNT_DEPTH:
+            raise ValueError("TRON_XPUB must be the account-level key for m/44'/195'/0'")
+        account = decompress(raw[45:78])
+        self.external, self.external_chain_code = derive_child(account, raw[13:45], 0)
+
+    def derive(self, index: int) -> str:
+        child, _ = derive_child(self.external, self.external_chain_code, index)
+        return tron_address(child)
@@ -1,5 +1,5 @@
 from cryptography.fernet import Fernet
-from typing import Optional
+from typing import Dict, Optional
 
 class KeyManager:
     def __init__(self, fernet_key: str, db):
@@ -19,3 +19,9 @@ class KeyManager:
             return None
         raw_key = self.fernet.decrypt(encrypted_key.encode()).decode()
         return raw_key
+
+    async def purchase_with_balance(self, user_id: int, variant: str, price_usd: float) -> Dict:
+        purchase = await self.db.purchase_with_balance(user_id, variant, price_usd)
+        if purchase["result"] == "ok":
+            purchase["key"] = self.fernet.decrypt(purchase.pop("key_value").encode()).decode()
+        return purchase
@@ -0,0 +1,88 @@
+import orjson
+import time
+from typing import Dict, List
+
+def encode_markup(markup: dict) -> bytes:
+    return orjson.dumps(markup)
+
+def encode_request(payload: dict) -> bytes:
+    # Pre-encoded reply_markup bytes are spliced in as-is instead of being re-serialized
+    markup = payload.get("reply_markup")
+    if not isinstance(markup, bytes):
+        return orjson.dumps(payload)
+    body = orjson.dumps({k: v for k, v in payload.items() if k != "reply_markup"})
+    return body[:-1] + b',"reply_markup":' + markup + b"}"
+
+WELCOME = encode_markup({"inline_keyboard": [
+    [{"text": "Browse Licenses", "callback_data": "browse"}],
+    [{"text": "Check Balance", "callback_data": "balance"}]
+]})
+PAYMENT_METHODS = encode_markup({"inline_keyboard": [
+    [
+        {"text": "USDT", "callback_data": "pay_usdt"},
+        {"text": "Binance Pay", "callback_data": "pay_binance"}
+    ],
+    [{"text": "Pay with Balance", "callback_data": "pay_balance"}]
+]})
+TOP_UP = encode_markup({"inline_keyboard": [[{"text": "Top Up $50+", "callback_data": "topup"}]]})
+COPY_ADDRESS = encode_markup({"inline_keyboard": [[{"text": "Copy Address", "callback_data": "copy_address"}]]})
+ADMIN_MENU = encode_markup({"inline_keyboard": [
+    [{"text": "Add Keys", "callback_data": "add_keys"}],
+    [{"text": "Assign Role", "callback_data": "assign_role"}],
+    [{"text": "Adjust Balance", "callback_data": "adjust_balance"}],
+    [{"text": "Set Branding", "callback_data": "set_branding"}],
+    [{"text": "View Logs", "callback_data": "view_logs"}],
+    [{"text": "Test Order", "callback_data": "test_order"}],
+    [{"text": "Bot Stats", "callback_data": "bot_stats"}]
+]})
+BACK_TO_ADMIN = encode_markup({"inline_keyboard": [[{"text": "Back", "callback_data": "admin_menu"}]]})
+ROLE_CHOICE = encode_markup({"inline_keyboard": [[
+    {"text": "Normal", "callback_data": "role_Normal"},
+    {"text": "Reseller", "callback_data": "role_Reseller"}
+]]})
+
+class KeyboardRenderer:
+    # Branding is rebuilt when Admin updates it and after ttl, so edits made by another instance
+    # show up too. The bot has no product editing, so ttl is the only refresh path for the
+    # catalog keyboards (e.g. after prices are changed directly in the database).
+    def __init__(self, db, ttl: float = 60.0):
+        self.db = db
+        self.ttl = ttl
+        self.branding = None
+        self.branding_loaded = 0.0
+        self.products = None
+        self.catalog = None
+        self.admin_variants = None
+        self.products_loaded = 0.0
+
+    async def get_branding(self) -> Dict:
+        if self.branding is None or time.monotonic() - self.branding_loaded > self.ttl:
+            self.branding = await self.db.get_branding()
+            self.branding_loaded = time.monotonic()
+        return self.branding
+
+    async def get_products(self) -> List[Dict]:
+        if self.products is None or time.monotonic() - self.products_loaded > self.ttl:
+            products = await self.db.get_products()
+            self.catalog = encode_markup({"inline_keyboard": [
+                [{"text": f"{p['variant']} ${p['price_usd']:.2f}", "callback_data": f"variant_{p['variant']}"}]
+                for p in products
+            ]})
+            self.admin_variants = encode_markup({"inline_keyboard": [
+                [{"text": p["variant"], "callback_data": f"variant_keys_{p['variant']}"}]
+                for p in products
+            ]})
+            self.products = products
+            self.products_loaded = time.monotonic()
+        return self.products
+
+    async def catalog_markup(self) -> bytes:
+        await self.get_products()
+        return self.catalog
+
+    async def admin_variants_markup(self) -> bytes:
+        await self.get_products()
+        return self.admin_variants
+
+    def invalidate_branding(self):
+        self.branding = None
@@ -7,21 +7,43 @@ from payment import PaymentProcessor
 from key_manager import KeyManager
 from user_flow import UserFlow
 from admin import Admin
+from address_pool import AddressPool
+from admission import AdmissionController
+from archiver import OrderArchiver
+from tracing import Tracer
+from keyboards import KeyboardRenderer
+from binance_webhook import BinancePayWebhook
 from logger import Logger
 
 load_dotenv()
 
 async def main():
     # Initialize components
-    db = Database(os.getenv("DATABASE_URL"))
+    db = Database(
+        os.getenv("DATABASE_URL"),
+        min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+        acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+    )
     await db.init()
     
     logger = Logger(db)
     payment = PaymentProcessor(
         tron_private_key=os.getenv("TRONWEB_PRIVATE_KEY"),
-        binance_pay_key=os.getenv("BINANCE_PAY_API_KEY")
+        binance_pay_key=os.getenv("BINANCE_PAY_API_KEY"),
+        tron_xpub=os.environ["TRON_XPUB"],
+        # Without the webhook, Binance Pay orders are checked on every 10s poll as before
+        binance_reconcile_interval=(
+            float(os.getenv("BINANCE_PAY_RECONCILE_INTERVAL", "300")) if os.getenv("BINANCE_PAY_CERT") else 0
+        )
     )
     key_manager = KeyManager(os.getenv("FERNET_KEY"), db)
+    address_pool = AddressPool(
+        db, payment, logger,
+        low_water=int(os.getenv("ADDRESS_POOL_LOW_WATER", "20")),
+        batch_size=int(os.getenv("ADDRESS_POOL_BATCH", "50"))
+    )
     
     telegram = TelegramHandler(
         token=os.getenv("TELEGRAM_TOKEN"),
@@ -29,21 +51,46 @@ async def main():
         db=db,
         payment=payment,
         key_manager=key_manager,
-        logger=logger
+        logger=logger,
+        admission=AdmissionController(
+            rate=float(os.getenv("USER_RATE_PER_SECOND", "1")),
+            burst=int(os.getenv("USER_RATE_BURST", "5")),
+            duplicate_window=float(os.getenv("DUPLICATE_CALLBACK_WINDOW", "5")),
+            overload_queue_depth=int(os.getenv("OVERLOAD_QUEUE_DEPTH", "200"))
+        ),
+        tracer=Tracer(
+            slow_threshold=float(os.getenv("SLOW_UPDATE_THRESHOLD", "2")),
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+            path=os.getenv("SLOW_UPDATE_LOG", "slow_updates.jsonl")
+        )
     )
     
-    user_flow = UserFlow(telegram, db, payment, key_manager, logger)
-    admin = Admin(telegram, db, key_manager, logger)
+    renderer = KeyboardRenderer(db)
+    user_flow = UserFlow(telegram, db, payment, key_manager, logger, address_pool, renderer)
+    admin = Admin(telegram, db, key_manager, logger, renderer)
     
     # Register handlers
     telegram.register_user_handler(user_flow.handle)
     telegram.register_admin_handler(admin.handle)
+    telegram.register_checkout_check(user_flow.awaiting_checkout_input)
     
-    # Start polling and payment checks
-    await asyncio.gather(
+    tasks = [
         telegram.start_polling(),
+        address_pool.run(),
+        OrderArchiver(db, logger, batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))).run(),
         payment.poll_payments(db, key_manager, logger, telegram)
-    )
+    ]
+    # Binance Pay notifications are verified against the certificate public key
+    if os.getenv("BINANCE_PAY_CERT"):
+        with open(os.getenv("BINANCE_PAY_CERT"), "rb") as f:
+            webhook = BinancePayWebhook(
+                f.read(), db, payment, key_manager, logger, telegram,
+                port=int(os.getenv("BINANCE_PAY_WEBHOOK_PORT", "8080"))
+            )
+        tasks.append(webhook.start())
+
+    # Start polling, payment checks, background maintenance and the webhook receiver
+    await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,69 @@
+-- Baseline schema; IF NOT EXISTS keeps it safe on deployments created before migrations
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    role TEXT DEFAULT 'Normal',
+    balance DECIMAL DEFAULT 0.0,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id SERIAL PRIMARY KEY,
+    name TEXT,
+    variant TEXT,
+    price_usd DECIMAL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id SERIAL PRIMARY KEY,
+    user_id BIGINT,
+    variant TEXT,
+    price_usd DECIMAL,
+    price_usdt DECIMAL,
+    payment_method TEXT,
+    crypto_address TEXT,
+    binance_pay_link TEXT,
+    status TEXT DEFAULT 'Pending',
+    created_at TIMESTAMP DEFAULT NOW(),
+    expires_at TIMESTAMP,
+    paid_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS keys (
+    key_id SERIAL PRIMARY KEY,
+    variant TEXT,
+    key_value TEXT,
+    status TEXT DEFAULT 'Available',
+    order_id BIGINT,
+    allocated_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS logs (
+    log_id SERIAL PRIMARY KEY,
+    order_id BIGINT,
+    user_id BIGINT,
+    event_type TEXT,
+    details TEXT,
+    timestamp TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS deposit_addresses (
+    address_id SERIAL PRIMARY KEY,
+    derivation_index INTEGER UNIQUE,
+    address TEXT UNIQUE,
+    status TEXT DEFAULT 'Free',
+    claimed_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS branding (
+    id SERIAL PRIMARY KEY,
+    bot_name TEXT DEFAULT 'GameKeyBot',
+    welcome_message TEXT DEFAULT 'Welcome, gamer! Ready to unlock your license?',
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Seed products and branding if empty
+INSERT INTO products (name, variant, price_usd)
+SELECT * FROM (VALUES
+    ('License', 'Basic', 50.0),
+    ('License', 'Pro', 99.0),
+    ('License', 'Premium', 150.0)
+) AS seed (name, variant, price_usd)
+WHERE NOT EXISTS (SELECT 1 FROM products);
+
+INSERT INTO branding (bot_name, welcome_message)
+SELECT 'GameKeyBot', 'Welcome, gamer! Ready to unlock your license?'
+WHERE NOT EXISTS (SELECT 1 FROM branding);
@@ -0,0 +1,16 @@
+-- migrate: no-transaction
+-- Built CONCURRENTLY so live tables stay writable; an interrupted build leaves an INVALID index
+-- that IF NOT EXISTS skips, so drop it by hand before rerunning.
+
+-- Payment poller: pending orders and expiry checks
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_status_expires_at_idx ON orders (status, expires_at);
+
+-- Key allocation and stock counts
+CREATE INDEX CONCURRENTLY IF NOT EXISTS keys_variant_status_idx ON keys (variant, status);
+
+-- Admin "View Logs"
+CREATE INDEX CONCURRENTLY IF NOT EXISTS logs_timestamp_idx ON logs (timestamp DESC);
+
+-- Deposit address claims and recycling
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deposit_addresses_free_idx ON deposit_addresses (address_id) WHERE status = 'Free';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_crypto_address_idx ON orders (crypto_address);
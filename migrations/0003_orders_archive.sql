@@ -0,0 +1,6 @@
+-- Settled orders past the late-payment window move here so the live orders table stays small.
+-- Columns mirror orders plus archived_at. A migration that adds a column to orders should add it
+-- here too and to the column list in Database.archive_orders.
+CREATE TABLE IF NOT EXISTS orders_archive (LIKE orders);
+ALTER TABLE orders_archive ADD PRIMARY KEY (order_id);
+ALTER TABLE orders_archive ADD COLUMN archived_at TIMESTAMP DEFAULT NOW();
@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- Nothing looks logs up by order_id; removes the index from databases that applied an earlier 0002
+DROP INDEX CONCURRENTLY IF EXISTS logs_order_id_idx;
@@ -0,0 +1,82 @@
+import asyncpg
+import os
+import re
+from typing import List, Tuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK_ID = 4_741_522_001  # pg_advisory_lock key shared by every bot instance
+# First-line marker for files that cannot run in a transaction (e.g. CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+
+class Migrator:
+    def __init__(self, migrations_dir: str = MIGRATIONS_DIR):
+        self.migrations_dir = migrations_dir
+        self.migrations = self.discover()
+
+    def discover(self) -> List[Tuple[int, str]]:
+        # Files are named NNNN_description.sql and applied in version order
+        migrations = []
+        for filename in os.listdir(self.migrations_dir):
+            match = re.fullmatch(r"(\d+)_\w+\.sql", filename)
+            if match:
+                migrations.append((int(match.group(1)), filename))
+        return sorted(migrations)
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1][0] if self.migrations else 0
+
+    async def current_version(self, conn) -> int:
+        try:
+            return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        except asyncpg.UndefinedTableError:
+            return 0
+
+    async def migrate(self, conn) -> int:
+        # Fast path: a single version check when the schema is already current
+        if await self.current_version(conn) >= self.latest_version:
+            return 0
+
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    filename TEXT,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            # Another instance may have migrated while we waited for the lock
+            current = await self.current_version(conn)
+            applied = 0
+            for version, filename in self.migrations:
+                if version <= current:
+                    continue
+                with open(os.path.join(self.migrations_dir, filename)) as f:
+                    sql = f.read()
+                if sql.startswith(NO_TRANSACTION_MARKER):
+                    await self.apply_without_transaction(conn, sql, version, filename)
+                else:
+                    async with conn.transaction():
+                        await conn.execute(sql)
+                        await self.record(conn, version, filename)
+                applied += 1
+            return applied
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    async def apply_without_transaction(self, conn, sql: str, version: int, filename: str):
+        # A multi-statement query runs as one implicit transaction, so statements go one at a time.
+        # They must be idempotent (IF NOT EXISTS): a failure part-way leaves earlier ones applied
+        # and the whole file is rerun. Splitting on ";" means no semicolons inside statements.
+        code = "\n".join(line for line in sql.splitlines() if not line.lstrip().startswith("--"))
+        for statement in code.split(";"):
+            if statement.strip():
+                await conn.execute(statement)
+        await self.record(conn, version, filename)
+
+    async def record(self, conn, version: int, filename: str):
+        await conn.execute(
+            "INSERT INTO schema_version (version, filename) VALUES ($1, $2)",
+            version, filename
+        )
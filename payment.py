@@ -1,17 +1,26 @@
 import aiohttp
 import asyncio
 import requests
-from typing import Optional, Dict, List
-from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+from datetime import datetime, timedelta
+from tracing import traced
+from hd_wallet import TronAddressDeriver
 # Note: tronweb requires external library or direct HTTP calls; using mock for simplicity
 # In production, install `tronpy` or similar and configure with private key
 
 class PaymentProcessor:
-    def __init__(self, tron_private_key: str, binance_pay_key: str):
+    def __init__(self, tron_private_key: str, binance_pay_key: str, tron_xpub: str,
+                 binance_reconcile_interval: float = 300.0):
         self.tron_private_key = tron_private_key
+        # Parsed up front so a missing or malformed xpub stops startup instead of every pool refill
+        self.tron_addresses = TronAddressDeriver(tron_xpub)
         self.binance_pay_key = binance_pay_key
         self.coingecko_url = "https://api.coingecko.com/api/v3/simple/price?ids=tether&vs_currencies=usd"
+        # Binance Pay is confirmed by webhook; polling is only a reconciliation sweep for missed notifications
+        self.binance_reconcile_interval = binance_reconcile_interval
+        self.last_binance_sweep = 0.0
 
+    @traced
     async def get_usdt_rate(self) -> float:
         async with aiohttp.ClientSession() as session:
             async with session.get(self.coingecko_url) as resp:
@@ -20,6 +29,7 @@ class PaymentProcessor:
                 data = await resp.json()
                 return data["tether"]["usd"]
 
+    @traced
     async def create_binance_pay_link(self, order_id: int, amount_usd: float) -> str:
         # Mock implementation; replace with real Binance Pay API
         # Requires merchant account and signed payload
@@ -27,42 +37,115 @@ class PaymentProcessor:
             "merchantId": "your_merchant_id",
             "amount": amount_usd,
             "currency": "USDT",
-            "orderNo": f"order_{order_id}",
+            "merchantTradeNo": self.merchant_trade_no(order_id),
             "description": f"GameKeyBot Order #{order_id}"
         }
         headers = {"Authorization": f"Bearer {self.binance_pay_key}"}
         # In production: POST to https://bpay.binanceapi.com/binancepay/openapi/v2/order
-        return f"https://pay.binance.com/mock/order_{order_id}"
+        return f"https://pay.binance.com/mock/{self.merchant_trade_no(order_id)}"
 
+    def merchant_trade_no(self, order_id: int) -> str:
+        # Binance Pay only accepts letters and digits here
+        return f"GKB{order_id:010d}"
+
+    def order_id_from_trade_no(self, merchant_trade_no: str) -> Optional[int]:
+        if not merchant_trade_no.startswith("GKB") or not merchant_trade_no[3:].isdigit():
+            return None
+        return int(merchant_trade_no[3:])
+
+    @traced
     async def check_binance_payment(self, order_id: int) -> bool:
         # Mock; replace with real API check
         return False  # Simulate unpaid for now
 
-    async def generate_tron_address(self) -> str:
-        # Mock; replace with TronWeb address generation
-        return "TRON_ADDRESS_MOCK"
+    def derive_tron_addresses(self, start: int, count: int) -> List[Tuple[int, str]]:
+        return [(index, self.tron_addresses.derive(index)) for index in range(start, start + count)]
 
+    @traced
     async def check_tron_payment(self, address: str, amount_usdt: float) -> bool:
         # Mock; replace with TronWeb transaction check (2 confirmations)
         return False  # Simulate unpaid for now
 
+    async def deliver_order(self, order: Dict, db, key_manager, logger, telegram) -> bool:
+        order_id = order["order_id"]
+        user_id = order["user_id"]
+        variant = order["variant"]
+        key = None
+
+        # Confirmation, key allocation / balance credit and logging commit together
+        async with db.transaction():
+            # Only the first confirmation (webhook retry, reconciliation sweep) delivers
+            if not await db.confirm_order(order_id):
+                return False
+            if variant == "TopUp":
+                await db.update_balance(user_id, order["price_usd"])
+                await logger.log("PaymentReceived", user_id, order_id, f"Top-up #{order_id} paid")
+            else:
+                key = await key_manager.allocate_key(variant, order_id)
+                if key:
+                    await logger.log("PaymentReceived", user_id, order_id, f"Order #{order_id} paid")
+                else:
+                    await logger.log("NoKey", user_id, order_id, f"No keys for {variant}")
+
+        # Messages only go out once the transaction has committed
+        if variant == "TopUp":
+            await telegram.send_message(
+                user_id,
+                f"Top-up #{order_id} received—${order['price_usd']:.2f} added to your balance."
+            )
+            await telegram.send_message(
+                telegram.owner_id,
+                f"Top-up #{order_id} by user #{user_id} paid and credited."
+            )
+        elif not key:
+            await telegram.send_message(
+                telegram.owner_id,
+                f"No keys left for paid order #{order_id} ({variant})!",
+                {"inline_keyboard": [[
+                    {"text": "Approve Key", "callback_data": f"approve_key_{order_id}"}
+                ]]}
+            )
+        else:
+            await telegram.send_message(
+                user_id,
+                f"Nice! Order #{order_id} paid—here’s your {variant} key: `{key}`"
+            )
+            await telegram.send_message(
+                telegram.owner_id,
+                f"Order #{order_id} by user #{user_id} paid and key delivered."
+            )
+        return True
+
+    async def notify_late_payment(self, order: Dict, logger, telegram):
+        order_id = order["order_id"]
+        await logger.log("LatePayment", order["user_id"], order_id, f"Late payment for #{order_id}")
+        await telegram.send_message(
+            telegram.owner_id,
+            f"Order #{order_id} expired, payment detected.",
+            {"inline_keyboard": [[
+                {"text": "Approve Key", "callback_data": f"approve_key_{order_id}"}
+            ]]}
+        )
+
     async def poll_payments(self, db, key_manager, logger, telegram):
+        loop = asyncio.get_running_loop()
         while True:
+            binance_due = loop.time() - self.last_binance_sweep >= self.binance_reconcile_interval
             orders = await db.get_pending_orders()
             for order in orders:
                 now = datetime.utcnow()
                 order_id = order["order_id"]
                 user_id = order["user_id"]
-                variant = order["variant"]
                 payment_method = order["payment_method"]
                 expires_at = order["expires_at"]
                 price_usdt = order["price_usdt"]
                 crypto_address = order["crypto_address"]
-                binance_pay_link = order["binance_pay_link"]
 
                 # Check expiry
                 if expires_at < now and order["status"] == "Pending":
-                    await db.update_order_status(order_id, "Expired")
+                    # Conditional: the webhook may have confirmed the order since the snapshot
+                    if not await db.expire_order(order_id):
+                        continue
                     await logger.log("OrderExpired", user_id, order_id, f"Order #{order_id} expired")
                     await telegram.send_message(
                         telegram.owner_id,
@@ -74,49 +157,18 @@ class PaymentProcessor:
                 paid = False
                 if payment_method == "USDT":
                     paid = await self.check_tron_payment(crypto_address, price_usdt)
-                elif payment_method == "BinancePay":
+                elif payment_method == "BinancePay" and binance_due:
                     paid = await self.check_binance_payment(order_id)
 
-                if paid:
-                    key = await key_manager.allocate_key(variant, order_id)
-                    if not key:
-                        await logger.log("NoKey", user_id, order_id, f"No keys for {variant}")
-                        await telegram.send_message(
-                            telegram.owner_id,
-                            f"No keys left for order #{order_id} ({variant})!"
-                        )
-                        continue
-                    await db.update_order_status(order_id, "Confirmed", "NOW()")
-                    await logger.log("PaymentReceived", user_id, order_id, f"Order #{order_id} paid")
-                    await telegram.send_message(
-                        user_id,
-                        f"Nice! Order #{order_id} paid—here’s your {variant} key: `{key}`"
-                    )
-                    await telegram.send_message(
-                        telegram.owner_id,
-                        f"Order #{order_id} by user #{user_id} paid and key delivered."
-                    )
+                if paid and order["status"] == "Pending":
+                    await self.deliver_order(order, db, key_manager, logger, telegram)
 
                 # Late payment check (up to 6 hours)
                 if order["status"] == "Expired" and expires_at > now - timedelta(hours=6):
                     if payment_method == "USDT" and await self.check_tron_payment(crypto_address, price_usdt):
-                        await logger.log("LatePayment", user_id, order_id, f"Late payment for #{order_id}")
-                        await telegram.send_message(
-                            telegram.owner_id,
-                            f"Order #{order_id} expired, payment detected.",
-                            {"inline_keyboard": [[
-                                {"text": "Approve Key", "callback_data": f"approve_key_{order_id}"}
-                            ]]}
-                        )
-                    elif payment_method == "BinancePay" and await self.check_binance_payment(order_id):
-                        await logger.log("LatePayment", user_id, order_id, f"Late payment for #{order_id}")
-                        await telegram.send_message(
-                            telegram.owner_id,
-                            f"Order #{order_id} expired, payment detected.",
-                            {"inline_keyboard": [[
-                                {"text": "Approve Key", "callback_data": f"approve_key_{order_id}"}
-                            ]]}
-                        )
+                        await self.notify_late_payment(order, logger, telegram)
+                    elif payment_method == "BinancePay" and binance_due and await self.check_binance_payment(order_id):
+                        await self.notify_late_payment(order, logger, telegram)
 
                 # 5-minute reminder
                 if expires_at < now + timedelta(minutes=6) and expires_at > now + timedelta(minutes=4):
@@ -125,4 +177,6 @@ class PaymentProcessor:
                         f"Hurry, gamer! 5 minutes left for order #{order_id}!"
                     )
 
+            if binance_due:
+                self.last_binance_sweep = loop.time()
             await asyncio.sleep(10)  # Poll every 10 seconds
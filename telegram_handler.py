@@ -1,19 +1,26 @@
 import aiohttp
 import asyncio
-import json
+import orjson
 from typing import Callable, Optional
+from tracing import detached_span
+from keyboards import encode_request
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 class TelegramHandler:
-    def __init__(self, token: str, owner_id: int, db, payment, key_manager, logger):
+    def __init__(self, token: str, owner_id: int, db, payment, key_manager, logger, admission, tracer):
         self.token = token
         self.owner_id = owner_id
         self.db = db
         self.payment = payment
         self.key_manager = key_manager
         self.logger = logger
+        self.admission = admission
+        self.tracer = tracer
         self.api_url = f"https://api.telegram.org/bot{token}/"
         self.user_handler: Optional[Callable] = None
         self.admin_handler: Optional[Callable] = None
+        self.checkout_check: Optional[Callable] = None
         self.queue = asyncio.Queue()
         self.rate_limit = 1.0  # 1 message/second per chat
 
@@ -23,7 +30,12 @@ class TelegramHandler:
     def register_admin_handler(self, handler: Callable):
         self.admin_handler = handler
 
-    async def send_message(self, chat_id: int, text: str, reply_markup: dict = None):
+    def register_checkout_check(self, check: Callable):
+        # check(user_id) -> True while the user's next text message is checkout input
+        self.checkout_check = check
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None):
+        # reply_markup is a dict, or bytes pre-encoded by keyboards.encode_markup
         payload = {
             "chat_id": chat_id,
             "text": text,
@@ -31,26 +43,29 @@ class TelegramHandler:
         }
         if reply_markup:
             payload["reply_markup"] = reply_markup
-        await self.queue.put(("sendMessage", payload))
+        # Finished by process_queue once Telegram has the message, so queue wait counts toward the update
+        await self.queue.put(("sendMessage", payload, detached_span("TelegramHandler.outbound")))
 
     async def process_queue(self):
         async with aiohttp.ClientSession() as session:
             while True:
-                method, payload = await self.queue.get()
+                method, payload, send_span = await self.queue.get()
+                body = encode_request(payload)
                 for attempt in range(3):
                     try:
-                        async with session.post(f"{self.api_url}{method}", json=payload) as resp:
+                        async with session.post(f"{self.api_url}{method}", data=body, headers=JSON_HEADERS) as resp:
                             if resp.status == 200:
                                 break
                             elif resp.status == 429:  # Rate limit
-                                retry_after = (await resp.json()).get("parameters", {}).get("retry_after", 1)
+                                retry_after = orjson.loads(await resp.read()).get("parameters", {}).get("retry_after", 1)
                                 await asyncio.sleep(retry_after)
                             else:
-                                await self.logger.log("system", f"Telegram API error: {resp.status}")
+                                await self.logger.log("system", details=f"Telegram API error: {resp.status}")
                                 break
                     except Exception as e:
-                        await self.logger.log("system", f"Telegram request failed: {e}")
+                        await self.logger.log("system", details=f"Telegram request failed: {e}")
                     await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                send_span.finish()
                 await asyncio.sleep(self.rate_limit)
                 self.queue.task_done()
 
@@ -64,15 +79,19 @@ class TelegramHandler:
                         if resp.status != 200:
                             await asyncio.sleep(5)
                             continue
-                        data = await resp.json()
+                        data = orjson.loads(await resp.read())
                         for update in data.get("result", []):
                             offset = update["update_id"] + 1
                             await self.handle_update(update)
                 except Exception as e:
-                    await self.logger.log("system", f"Polling error: {e}")
+                    await self.logger.log("system", details=f"Polling error: {e}")
                     await asyncio.sleep(5)
 
     async def handle_update(self, update: dict):
+        with self.tracer.trace_update(update_id=update.get("update_id")) as root:
+            await self.dispatch_update(update, root)
+
+    async def dispatch_update(self, update: dict, root):
         message = update.get("message", {})
         callback = update.get("callback_query", {})
         chat_id = message.get("chat", {}).get("id") or callback.get("message", {}).get("chat", {}).get("id")
@@ -80,10 +99,20 @@ class TelegramHandler:
         
         if not chat_id or not user_id:
             return
+        root.trace.attrs["user_id"] = user_id
+        root.trace.attrs["callback_data"] = callback.get("data")
+
+        # The owner is never throttled; everyone else goes through admission control
+        if user_id != self.owner_id:
+            checkout_reply = not callback and self.checkout_check is not None and self.checkout_check(user_id)
+            if not self.admission.admit(user_id, callback, self.queue.qsize(), checkout_reply):
+                return
 
-        if user_id == self.owner_id:
-            if self.admin_handler:
-                await self.admin_handler(chat_id, user_id, message, callback)
-        else:
-            if self.user_handler:
-                await self.user_handler(chat_id, user_id, message, callback)
+        # All Database calls made while handling this update share one pooled connection
+        async with self.db.unit_of_work():
+            if user_id == self.owner_id:
+                if self.admin_handler:
+                    await self.admin_handler(chat_id, user_id, message, callback)
+            else:
+                if self.user_handler:
+                    await self.user_handler(chat_id, user_id, message, callback)
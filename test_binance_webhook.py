@@ -0,0 +1,159 @@
+import asyncio
+import json
+import secrets
+import socket
+import time
+from contextlib import asynccontextmanager
+from binance_pay_standin import BinancePayStandIn
+from binance_webhook import BinancePayWebhook
+from hd_wallet import XPUB_VERSION, base58check_encode, compress, point_mul
+from payment import PaymentProcessor
+
+# Account-level xpub (depth 3) for an arbitrary test key; only needed to construct PaymentProcessor
+TEST_XPUB = base58check_encode(
+    XPUB_VERSION + bytes([3]) + b"\x00" * 4 + (0x80000000).to_bytes(4, "big")
+    + b"\x01" * 32 + compress(point_mul(12345))
+)
+
+class FakeDB:
+    def __init__(self, orders):
+        self.orders = orders
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        yield
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def get_order(self, order_id):
+        return self.orders.get(order_id)
+
+    async def confirm_order(self, order_id):
+        if self.orders[order_id]["status"] != "Pending":
+            return False
+        self.orders[order_id]["status"] = "Confirmed"
+        return True
+
+class FakeKeyManager:
+    async def allocate_key(self, variant, order_id):
+        return f"{variant}-KEY"
+
+class FakeLogger:
+    def __init__(self):
+        self.events = []
+
+    async def log(self, event_type, user_id=None, order_id=None, details=None):
+        self.events.append(event_type)
+
+class FakeTelegram:
+    owner_id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((chat_id, text))
+
+class FakeRequest:
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+    async def read(self):
+        return self.body
+
+def make_webhook(standin, port=8080):
+    payment = PaymentProcessor("tron_key", "binance_key", TEST_XPUB)
+    db = FakeDB({7: {"order_id": 7, "user_id": 42, "variant": "Pro", "price_usd": 99.0,
+                     "payment_method": "BinancePay", "status": "Pending"}})
+    webhook = BinancePayWebhook(standin.public_key_pem, db, payment, FakeKeyManager(),
+                                FakeLogger(), FakeTelegram(), host="127.0.0.1", port=port)
+    return webhook, payment, db
+
+def signed_request(standin, body):
+    timestamp = str(int(time.time() * 1000))
+    nonce = secrets.token_hex(16)
+    return FakeRequest(body, {
+        "BinancePay-Timestamp": timestamp,
+        "BinancePay-Nonce": nonce,
+        "BinancePay-Signature": standin.sign(timestamp, nonce, body)
+    })
+
+def test_verify_accepts_standin_signature_only():
+    standin = BinancePayStandIn("http://unused")
+    webhook, _, _ = make_webhook(standin)
+    timestamp = str(int(time.time() * 1000))
+    body = b'{"bizType":"PAY"}'
+    signature = standin.sign(timestamp, "nonce", body)
+
+    assert webhook.verify(timestamp, "nonce", body, signature)
+    assert not webhook.verify(timestamp, "nonce", body + b" ", signature)
+    assert not webhook.verify(timestamp, "nonce", body, BinancePayStandIn("http://unused").sign(timestamp, "nonce", body))
+    stale = str(int((time.time() - 3600) * 1000))
+    assert not webhook.verify(stale, "nonce", body, standin.sign(stale, "nonce", body))
+
+def test_unknown_order_is_ignored():
+    webhook, payment, db = make_webhook(BinancePayStandIn("http://unused"))
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", {"merchantTradeNo": payment.merchant_trade_no(99), "totalFee": 99.0}))
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", {"merchantTradeNo": "not-ours", "totalFee": 99.0}))
+
+    assert webhook.telegram.sent == []
+    assert db.orders[7]["status"] == "Pending"
+
+def test_underpaid_order_is_not_delivered():
+    webhook, payment, db = make_webhook(BinancePayStandIn("http://unused"))
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", {"merchantTradeNo": payment.merchant_trade_no(7), "totalFee": 50.0}))
+
+    assert db.orders[7]["status"] == "Pending"
+    assert webhook.telegram.sent == []
+    assert "Underpaid" in webhook.logger.events
+
+def test_pending_order_is_delivered_once():
+    webhook, payment, db = make_webhook(BinancePayStandIn("http://unused"))
+    data = {"merchantTradeNo": payment.merchant_trade_no(7), "totalFee": 99.0}
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", data))
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", data))
+
+    assert db.orders[7]["status"] == "Confirmed"
+    assert [chat_id for chat_id, text in webhook.telegram.sent if "Pro-KEY" in text] == [42]
+
+def test_malformed_notification_gets_fail_response():
+    standin = BinancePayStandIn("http://unused")
+    webhook, _, _ = make_webhook(standin)
+    for body in [b"not json", b'{"bizType":"PAY"}', b'{"bizType":"PAY","bizStatus":"PAY_SUCCESS","data":"[]"}', b"[]"]:
+        response = asyncio.run(webhook.handle(signed_request(standin, body)))
+        assert response.status == 400
+        assert json.loads(response.body)["returnCode"] == "FAIL"
+
+def test_standin_notification_over_http_delivers_key():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    standin = BinancePayStandIn(f"http://127.0.0.1:{port}/binancepay/webhook")
+    webhook, payment, db = make_webhook(standin, port)
+
+    async def run():
+        server = asyncio.create_task(webhook.start())
+        await asyncio.sleep(0.2)
+        try:
+            return await standin.send_notification(payment.merchant_trade_no(7), 99.0)
+        finally:
+            server.cancel()
+
+    assert asyncio.run(run()) == 200
+    assert db.orders[7]["status"] == "Confirmed"
+
+def test_order_expired_before_confirmation_is_reported_as_late_payment():
+    webhook, payment, db = make_webhook(BinancePayStandIn("http://unused"))
+
+    async def expired_by_poller(order_id):
+        db.orders[order_id]["status"] = "Expired"
+        return False
+    db.confirm_order = expired_by_poller
+
+    asyncio.run(webhook.process_payment("PAY_SUCCESS", {"merchantTradeNo": payment.merchant_trade_no(7), "totalFee": 99.0}))
+
+    assert "LatePayment" in webhook.logger.events
+    assert [chat_id for chat_id, text in webhook.telegram.sent] == [FakeTelegram.owner_id]
@@ -0,0 +1,21 @@
+import pytest
+from hd_wallet import TronAddressDeriver, keccak256
+
+# Account xpub for m/44'/195'/0' of the BIP39 test mnemonic "abandon ... abandon about"
+TEST_XPUB = "xpub6D1AabNHCupeiLM65ZR9UStMhJ1vCpyV4XbZdyhMZBiJXALQtmn9p42VTQckoHVn8WNqS7dqnJokZHAHcHGoaQgmv8D45oNUKx6DZMNZBCd"
+
+def test_keccak256_is_not_sha3():
+    assert keccak256(b"").hex() == "c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"
+
+def test_derives_known_tron_addresses():
+    deriver = TronAddressDeriver(TEST_XPUB)
+
+    assert deriver.derive(0) == "TUEZSdKsoDHQMeZwihtdoBiN46zxhGWYdH"
+    assert deriver.derive(1) == "TSeJkUh4Qv67VNFwY8LaAxERygNdy6NQZK"
+    assert deriver.derive(2) == "TYJPRrdB5APNeRs4R7fYZSwW3TcrTKw2gx"
+    assert deriver.derive(57) == "TDv3LbKPLqQX4U27hqV1GUNj6B4DgpYfHu"
+
+def test_rejects_missing_or_corrupted_xpub():
+    for xpub in ["", TEST_XPUB[:-1] + "e"]:
+        with pytest.raises(ValueError):
+            TronAddressDeriver(xpub)
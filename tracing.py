@@ -0,0 +1,119 @@
+import contextvars
+import functools
+import json
+import random
+import time
+from datetime import datetime
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name: str, trace, parent=None):
+        self.name = name
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.token = None
+        if parent is not None:
+            parent.children.append(self)
+        trace.open_spans += 1
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            self.trace.span_finished(self)
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        current_span.reset(self.token)
+        self.finish()
+
+    def to_dict(self, origin: float) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+
+class NoopSpan:
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Trace:
+    # Completes when the root and every detached child (e.g. queued sends) have finished
+    def __init__(self, tracer, attrs: dict):
+        self.tracer = tracer
+        self.attrs = attrs
+        self.started_at = datetime.utcnow()
+        self.open_spans = 0
+        self.last_end = 0.0
+        self.root = None
+
+    def span_finished(self, span: Span):
+        self.open_spans -= 1
+        self.last_end = max(self.last_end, span.end)
+        if self.open_spans == 0:
+            self.tracer.finish(self)
+
+def span(name: str):
+    # Outside an update (background loops) there is nothing to attach to
+    parent = current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace, parent)
+
+def detached_span(name: str):
+    # For work finished later by another task (queued sends): never entered as the current span,
+    # just finish() it when done; the trace stays open until then
+    return span(name)
+
+def traced(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with span(name):
+            return await func(*args, **kwargs)
+    return wrapper
+
+class Tracer:
+    def __init__(self, slow_threshold: float = 2.0, sample_rate: float = 0.01, path: str = "slow_updates.jsonl"):
+        self.slow_threshold = slow_threshold  # seconds from update receipt to last outbound send
+        self.sample_rate = sample_rate  # share of fast updates also written, as a baseline
+        self.path = path
+
+    def trace_update(self, **attrs) -> Span:
+        # Every update records its full span tree (a handful of small objects; updates run
+        # serially), so any slow update can be written with its breakdown
+        trace = Trace(self, attrs)
+        trace.root = Span("handle_update", trace)
+        return trace.root
+
+    def finish(self, trace: Trace):
+        duration = trace.last_end - trace.root.start
+        slow = duration >= self.slow_threshold
+        if not slow and random.random() >= self.sample_rate:
+            return
+        record = {
+            "started_at": trace.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "slow": slow,
+            **trace.attrs,
+            "span": trace.root.to_dict(trace.root.start)
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -1,15 +1,21 @@
 from typing import Dict, Optional
 from datetime import datetime, timedelta
+import keyboards
 
 class UserFlow:
-    def __init__(self, telegram, db, payment, key_manager, logger):
+    def __init__(self, telegram, db, payment, key_manager, logger, address_pool, renderer):
         self.telegram = telegram
         self.db = db
         self.payment = payment
+        self.address_pool = address_pool
+        self.renderer = renderer
         self.key_manager = key_manager
         self.logger = logger
         self.user_states = {}  # {user_id: {"step": str, "data": dict}}
 
+    def awaiting_checkout_input(self, user_id: int) -> bool:
+        return self.user_states.get(user_id, {}).get("step") == "enter_topup"
+
     async def handle(self, chat_id: int, user_id: int, message: Dict, callback: Dict):
         # Initialize user
         user = await self.db.get_user(user_id)
@@ -17,7 +23,7 @@ class UserFlow:
             await self.db.create_user(user_id)
             user = await self.db.get_user(user_id)
 
-        branding = await self.db.get_branding()
+        branding = await self.renderer.get_branding()
         bot_name = branding["bot_name"]
         welcome_message = branding["welcome_message"]
 
@@ -31,29 +37,29 @@ class UserFlow:
                 await self.show_products(chat_id)
             elif data.startswith("variant_"):
                 variant = data.split("_")[1]
-                products = await self.db.get_products()
+                products = await self.renderer.get_products()
                 product = next((p for p in products if p["variant"] == variant), None)
                 if not product:
                     return
-                price_usd = product["price_usd"] * (0.8 if user["role"] == "Reseller" else 1.0)
+                price_usd = float(product["price_usd"]) * (0.8 if user["role"] == "Reseller" else 1.0)
                 self.user_states[user_id] = {
                     "step": "select_payment",
                     "data": {"variant": variant, "price_usd": price_usd}
                 }
                 await self.telegram.send_message(
                     chat_id,
-                    f"Selected {variant} for ${price_usd:.2f}. How would you like to pay?",
-                    {"inline_keyboard": [[
-                        {"text": "USDT", "callback_data": "pay_usdt"},
-                        {"text": "Binance Pay", "callback_data": "pay_binance"}
-                    ]]}
+                    f"Selected {variant} for ${price_usd:.2f} (balance: ${user['balance']:.2f}). How would you like to pay?",
+                    keyboards.PAYMENT_METHODS
                 )
             elif data == "pay_usdt":
                 state_data = state["data"]
                 variant = state_data["variant"]
                 price_usd = state_data["price_usd"]
+                address = await self.address_pool.claim()
+                if not address:
+                    await self.telegram.send_message(chat_id, "Checkout is busy right now, please try again in a minute.")
+                    return
                 price_usdt = price_usd / (await self.payment.get_usdt_rate())
-                address = await self.payment.generate_tron_address()
                 order_id = await self.db.create_order(
                     user_id, variant, price_usd, price_usdt, "USDT", crypto_address=address
                 )
@@ -65,7 +71,7 @@ class UserFlow:
                 await self.telegram.send_message(
                     chat_id,
                     f"Order #{order_id} created! Pay `{price_usdt:.2f} USDT` to `{address}`.",
-                    {"inline_keyboard": [[{"text": "Copy Address", "callback_data": "copy_address"}]]}
+                    keyboards.COPY_ADDRESS
                 )
                 self.user_states.pop(user_id, None)
             elif data == "pay_binance":
@@ -73,10 +79,11 @@ class UserFlow:
                 variant = state_data["variant"]
                 price_usd = state_data["price_usd"]
                 price_usdt = price_usd / (await self.payment.get_usdt_rate())
-                link = await self.payment.create_binance_pay_link(order_id=0, amount_usd=price_usd)
                 order_id = await self.db.create_order(
-                    user_id, variant, price_usd, price_usdt, "BinancePay", binance_pay_link=link
+                    user_id, variant, price_usd, price_usdt, "BinancePay"
                 )
+                link = await self.payment.create_binance_pay_link(order_id=order_id, amount_usd=price_usd)
+                await self.db.set_binance_pay_link(order_id, link)
                 await self.logger.log("OrderCreated", user_id, order_id, f"Order #{order_id} for {variant}")
                 await self.telegram.send_message(
                     self.telegram.owner_id,
@@ -88,11 +95,41 @@ class UserFlow:
                     {"inline_keyboard": [[{"text": "Open Binance Pay", "url": link}]]}
                 )
                 self.user_states.pop(user_id, None)
+            elif data == "pay_balance":
+                state_data = state["data"]
+                variant = state_data["variant"]
+                price_usd = state_data["price_usd"]
+                purchase = await self.key_manager.purchase_with_balance(user_id, variant, price_usd)
+                if purchase["result"] == "insufficient":
+                    await self.telegram.send_message(
+                        chat_id,
+                        f"Not enough balance: ${purchase['balance']:.2f} of ${price_usd:.2f}.",
+                        keyboards.TOP_UP
+                    )
+                    return
+                if purchase["result"] == "no_key":
+                    await self.logger.log("NoKey", user_id, details=f"No keys for {variant} (balance checkout)")
+                    await self.telegram.send_message(
+                        chat_id,
+                        f"Sorry, {variant} is out of stock right now. Your balance was not charged."
+                    )
+                    return
+                order_id = purchase["order_id"]
+                self.user_states.pop(user_id, None)
+                await self.logger.log("PaymentReceived", user_id, order_id, f"Order #{order_id} paid from balance")
+                await self.telegram.send_message(
+                    chat_id,
+                    f"Nice! Order #{order_id} paid from balance—here’s your {variant} key: `{purchase['key']}`"
+                )
+                await self.telegram.send_message(
+                    self.telegram.owner_id,
+                    f"Order #{order_id} by user #{user_id} paid from balance and key delivered."
+                )
             elif data == "balance":
                 await self.telegram.send_message(
                     chat_id,
                     f"Your balance: ${user['balance']:.2f}",
-                    {"inline_keyboard": [[{"text": "Top Up $50+", "callback_data": "topup"}]]}
+                    keyboards.TOP_UP
                 )
             elif data == "topup":
                 self.user_states[user_id] = {"step": "enter_topup", "data": {}}
@@ -112,8 +149,11 @@ class UserFlow:
                 if amount < 50:
                     await self.telegram.send_message(chat_id, "Minimum top-up is $50!")
                     return
+                address = await self.address_pool.claim()
+                if not address:
+                    await self.telegram.send_message(chat_id, "Checkout is busy right now, please try again in a minute.")
+                    return
                 price_usdt = amount / (await self.payment.get_usdt_rate())
-                address = await self.payment.generate_tron_address()
                 order_id = await self.db.create_order(
                     user_id, "TopUp", amount, price_usdt, "USDT", crypto_address=address
                 )
@@ -125,7 +165,7 @@ class UserFlow:
                 await self.telegram.send_message(
                     chat_id,
                     f"Top-up order #{order_id} created! Pay `{price_usdt:.2f} USDT` to `{address}`.",
-                    {"inline_keyboard": [[{"text": "Copy Address", "callback_data": "copy_address"}]]}
+                    keyboards.COPY_ADDRESS
                 )
                 self.user_states.pop(user_id, None)
             except ValueError:
@@ -136,18 +176,12 @@ class UserFlow:
         await self.telegram.send_message(
             chat_id,
             f"{welcome_message}",
-            {"inline_keyboard": [
-                [{"text": "Browse Licenses", "callback_data": "browse"}],
-                [{"text": "Check Balance", "callback_data": "balance"}]
-            ]}
+            keyboards.WELCOME
         )
 
     async def show_products(self, chat_id: int):
-        products = await self.db.get_products()
-        buttons = [[{"text": f"{p['variant']} ${p['price_usd']:.2f}", "callback_data": f"variant_{p['variant']}"}]
-                   for p in products]
         await self.telegram.send_message(
             chat_id,
             "Choose your license, gamer!",
-            {"inline_keyboard": buttons}
+            await self.renderer.catalog_markup()
         )